@@ -71,6 +71,7 @@ export type AnomalyLogItem = {
   confidence: number;
   timestamp: string;
   frame_bytes_base64?: string;
+  frame_bytes_token?: string;
 };
 
 export type Summary = {
@@ -92,6 +93,7 @@ export type DetectVideoResponse = {
   anomaly_log: AnomalyLogItem[];
   det_counts: Record<string, number>;
   summary: Summary;
+  log_truncated?: boolean;
   frames_processed: number;
 };
 
@@ -4,25 +4,36 @@ Thin API layer over existing YOLO model, underwater_augment, and report_gen.
 Model and training code are unchanged. Run: uvicorn main_api:app --reload --host 0.0.0.0 --port 8000
 """
 
+import asyncio
 import os
 import sys
+import threading
 import time
 import tempfile
 import base64
+from collections import deque
+import bisect
+import hashlib
 import io
 import secrets
 import smtplib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from functools import lru_cache, partial
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Optional
-import json
 
+import cv2
+import numpy as np
+import orjson
+from cachetools import TTLCache
 from dotenv import load_dotenv
 from fastapi import Depends, FastAPI, File, Form, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -145,7 +156,21 @@ SEVERITY = {
     "healthy": ("NORMAL", "n", "b-n"),
     "anode": ("NORMAL", "n", "b-n"),
 }
+CRITICAL_SET = frozenset({"corrosion", "damage", "free_span"})
+WARNING_SET = frozenset({"marine_growth", "debris"})
+NORMAL_SET = frozenset({"healthy", "anode"})
+CLASS_TO_SEVERITY = {k: v[0] for k, v in SEVERITY.items()}
+_DEFAULT_SEV = "WARNING"
 DIFF_THRESHOLD = 0.50
+VIDEO_BATCH_SIZE = 8  # sampled frames per m.predict call in /api/detect/video
+MAX_VIDEO_SIDE = 960  # video frames are downscaled to this longest side before simulation/inference
+INFER_IMGSZ = 640  # YOLO inference size (training resolution)
+MAX_VIDEO_LOG = int(os.getenv("NAUTICAI_MAX_LOG", "256"))  # anomaly_log cap per /api/detect/video call
+if MAX_VIDEO_LOG < 1:
+    raise ValueError(f"NAUTICAI_MAX_LOG must be a positive integer, got {MAX_VIDEO_LOG}")
+JPEG_QUALITY = 95  # same as cv2.imencode's default
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB read size when spooling video uploads to disk
+REPORT_CHUNK_SIZE = 1 << 20  # 1 MiB chunks when streaming generated PDFs
 CLASS_NAMES = list(SEVERITY.keys())  # Used by lightweight health check (no model load)
 
 MODEL_PATH = BASE_DIR / "weights" / "best.pt"
@@ -155,6 +180,8 @@ app = FastAPI(
     title="NautiCAI API",
     description="Underwater anomaly detection — image/video inference and PDF report generation",
     version="1.0.0",
+    # orjson serializes the large base64-laden detect responses much faster than stdlib json
+    default_response_class=ORJSONResponse,
 )
 
 # Ensure auth tables exist on startup
@@ -179,37 +206,189 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ── Model (lazy load on first request to keep Render free tier under 512MB at startup) ──
+# ── Model (lazy load, warmed up in the background after startup) ──────────────
 model = None
+_model_lock = threading.Lock()
 
 def get_model():
     """
-    Lazily import and initialize the YOLO model on first real detection request.
+    Lazily import and initialize the YOLO model.
     This avoids importing ultralytics/torch during startup and keeps Render health
-    checks fast and lightweight.
+    checks fast and lightweight. Normally triggered by the startup warmup below;
+    the lock keeps a racing first request from loading a second copy.
+    The dummy predict runs before the model is published, so it never overlaps a
+    request's predict on the shared (non-thread-safe) ultralytics predictor.
     """
     global model
     if model is None:
-        from ultralytics import YOLO  # Local import to avoid heavy startup cost
-        if MODEL_PATH.exists():
-            model = YOLO(str(MODEL_PATH))
-        else:
-            model = YOLO("yolov8n.pt")
+        with _model_lock:
+            if model is None:
+                from ultralytics import YOLO  # Local import to avoid heavy startup cost
+                weights = resolve_model_weights()
+                with torch_load_mmap():
+                    if weights is not None:
+                        m = YOLO(str(weights), task="detect")
+                    else:
+                        m = YOLO("yolov8n.pt")
+                # Pays CUDA/ultralytics predictor init here rather than on the first real request
+                m.predict(np.zeros((320, 320, 3), dtype=np.uint8), verbose=False)
+                model = m
     return model
 
 
+@contextmanager
+def torch_load_mmap():
+    """
+    Make torch.load memory-map .pt checkpoints while loading the model, so tensor storages are paged in
+    from the file instead of being read into a buffer and copied. No-op on torch builds without the knob.
+    """
+    try:
+        from torch.utils.serialization import config as torch_serialization_config
+        previous = torch_serialization_config.load.mmap
+    except Exception:
+        yield
+        return
+    torch_serialization_config.load.mmap = True
+    try:
+        yield
+    finally:
+        torch_serialization_config.load.mmap = previous
+
+
+def resolve_model_weights() -> Path | None:
+    """
+    Prefer an exported copy of MODEL_PATH (see `python train.py --mode export`) when its runtime is installed
+    and it accepts batched input (detect_video sends VIDEO_BATCH_SIZE frames per call):
+    TensorRT engine, then ONNX Runtime, then the PyTorch checkpoint. Returns None if no custom weights exist.
+    """
+    from importlib.util import find_spec
+
+    engine_path = MODEL_PATH.with_suffix(".engine")
+    if engine_path.exists() and find_spec("tensorrt"):
+        if engine_supports_batch(engine_path, VIDEO_BATCH_SIZE):
+            return engine_path
+        print(f"[Model] Ignoring {engine_path.name}: not a dynamic-batch export (batch >= {VIDEO_BATCH_SIZE})")
+    onnx_path = MODEL_PATH.with_suffix(".onnx")
+    if onnx_path.exists() and find_spec("onnx") and find_spec("onnxruntime"):
+        if onnx_has_dynamic_batch(onnx_path):
+            return onnx_path
+        print(f"[Model] Ignoring {onnx_path.name}: batch dimension is static, re-export with dynamic=True")
+    if MODEL_PATH.exists():
+        return MODEL_PATH
+    return None
+
+
+def onnx_has_dynamic_batch(path: Path) -> bool:
+    """True if the ONNX model's first input has a symbolic (or unset) batch dimension."""
+    try:
+        import onnx
+
+        graph = onnx.load(str(path), load_external_data=False).graph
+        batch_dim = graph.input[0].type.tensor_type.shape.dim[0]
+        return bool(batch_dim.dim_param) or not batch_dim.HasField("dim_value")
+    except Exception:
+        return False
+
+
+def engine_supports_batch(path: Path, batch: int) -> bool:
+    """
+    True if the TensorRT engine was built by ultralytics with dynamic=True and a max batch >= `batch`.
+    Reads the JSON metadata header ultralytics prepends; raw trtexec engines have none and are rejected.
+    """
+    try:
+        with open(path, "rb") as f:
+            meta_len = int.from_bytes(f.read(4), byteorder="little")
+            metadata = orjson.loads(f.read(meta_len))
+        return bool(metadata.get("args", {}).get("dynamic")) and int(metadata.get("batch", 1)) >= batch
+    except Exception:
+        return False
+
+
+@lru_cache(maxsize=1)
+def get_class_name_array(m):
+    """m.names as a NumPy array, so a whole vector of class ids maps to names in one indexing op."""
+    return np.array([m.names[i] for i in range(len(m.names))])
+
+
+@lru_cache(maxsize=1)
+def get_turbojpeg():
+    """
+    TurboJPEG encode function if PyTurboJPEG and libturbojpeg are installed, else None (cv2.imencode is used).
+    Uses 4:2:0 chroma subsampling like cv2.imencode (PyTurboJPEG defaults to 4:2:2), so both paths match.
+    """
+    try:
+        from turbojpeg import TJSAMP_420, TurboJPEG
+        return partial(TurboJPEG().encode, quality=JPEG_QUALITY, jpeg_subsample=TJSAMP_420)
+    except Exception as e:
+        # lru_cache means this is reported once per process, not per frame
+        print(f"[JPEG] TurboJPEG unavailable, falling back to cv2.imencode: {e}")
+        return None
+
+
+def encode_jpeg(img) -> bytes:
+    """JPEG-encode a BGR frame, preferring SIMD libjpeg-turbo over OpenCV's encoder."""
+    tj_encode = get_turbojpeg()
+    if tj_encode is not None:
+        return tj_encode(img)
+    _, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    return buf.tobytes()
+
+
+def _do_warmup() -> None:
+    """Load the model and run one dummy prediction so CUDA/ultralytics init is paid off the request path."""
+    try:
+        get_model()
+        print("[Warmup] Model loaded and warmed up")
+    except Exception as e:
+        print(f"[Warmup] ERROR: {e}")
+
+
+@app.on_event("startup")
+async def _warmup():
+    # Set NAUTICAI_SKIP_WARMUP=1 to keep startup memory minimal (model then loads on first /api/detect/*)
+    if os.getenv("NAUTICAI_SKIP_WARMUP", "").lower() in ("1", "true", "yes"):
+        return
+    asyncio.get_event_loop().run_in_executor(None, _do_warmup)
+
+
+# Integration config is read once at import (after load_dotenv), not on every alert / summary
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+TWILIO_WHATSAPP_FROM = os.getenv("TWILIO_WHATSAPP_FROM")  # e.g. 'whatsapp:+14155238886'
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+
+@lru_cache(maxsize=1)
 def get_twilio_client():
-    """Return (client, from_number) if Twilio WhatsApp is configured, else (None, None)."""
-    sid = os.getenv("TWILIO_ACCOUNT_SID")
-    token = os.getenv("TWILIO_AUTH_TOKEN")
-    from_number = os.getenv("TWILIO_WHATSAPP_FROM")  # e.g. 'whatsapp:+14155238886'
-    if not (sid and token and from_number):
+    """
+    Return (client, from_number) if Twilio WhatsApp is configured, else (None, None).
+    Built once; the client's HTTP session (and keep-alive connection) is reused across sends.
+    """
+    if not (TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_WHATSAPP_FROM):
         return None, None
     try:
-        client = TwilioClient(sid, token)
+        client = TwilioClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
     except Exception:
         return None, None
-    return client, from_number
+    return client, TWILIO_WHATSAPP_FROM
+
+
+@lru_cache(maxsize=1)
+def get_gemini_client():
+    """Shared httpx.AsyncClient so Gemini calls reuse pooled TLS connections and don't block the event loop."""
+    import httpx  # type: ignore
+
+    return httpx.AsyncClient(
+        timeout=20,
+        http2=True,
+        limits=httpx.Limits(max_connections=16, max_keepalive_connections=4),
+    )
+
+
+@app.on_event("shutdown")
+async def _close_gemini_client():
+    if get_gemini_client.cache_info().currsize:
+        await get_gemini_client().aclose()
 
 
 def send_whatsapp_alert(phone: str, mission_name: str, vessel_id: str, risk_level: str, recommendation: str) -> tuple[bool, str]:
@@ -240,7 +419,44 @@ def send_whatsapp_alert(phone: str, mission_name: str, vessel_id: str, risk_leve
         return False, str(e)
 
 
-def call_gemini_mission_agent(
+GEMINI_SYSTEM_PROMPT = (
+    "You are an underwater inspection mission assistant for NautiCAI. "
+    "Given structured detection data from hull/pipeline missions, you must:\n"
+    "1) Explain the mission risk level briefly.\n"
+    "2) Summarize the most important anomalies for an ROV/AUV operator.\n"
+    "3) Provide clear, concise next-step recommendations.\n"
+    "4) Generate a short WhatsApp-friendly alert message.\n"
+    "Respond strictly in compact JSON with keys: "
+    "headline (string), bullets (array of strings), "
+    "recommendations (string), whatsapp_message (string).\n\n"
+    "The whatsapp_message MUST follow this structure:\n"
+    "  - First line: \"Hey <operator_name>, we found <short risk summary>.\" (friendly but professional)\n"
+    "  - Then a blank line.\n"
+    "  - One line: \"Mission: <mission_name>\".\n"
+    "  - One line: \"Vessel/ROV: <vessel_id>\".\n"
+    "  - One line: \"Location: <location>\".\n"
+    "  - Blank line.\n"
+    "  - One line summarising counts, e.g. \"Detections: total=<total>, critical=<critical>, warnings=<warnings>.\".\n"
+    "  - Then a short bulleted list (max 3 bullets) of key findings, one per line, starting with \"• \".\n"
+    "  - Final line starting with \"Recommendation:\" and a concise action item.\n"
+    "Do not wrap the message in backticks or quotes. Keep it under 8 lines total."
+)
+
+# Frame payloads stay server-side: images are useless to the text prompt, and frame_bytes_token is a
+# per-run random capability for /api/report/generate that would also make every cache key unique
+GEMINI_EXCLUDED_LOG_KEYS = frozenset({"frame_bytes", "frame_bytes_base64", "frame_bytes_token"})
+
+# Gemini results keyed by a hash of the mission payload; identical missions skip the LLM round-trip
+GEMINI_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=600)
+
+
+def gemini_cache_key(payload: dict) -> str:
+    return hashlib.blake2b(
+        orjson.dumps(payload, option=orjson.OPT_SORT_KEYS, default=str), digest_size=16
+    ).hexdigest()
+
+
+async def call_gemini_mission_agent(
     *,
     risk_level: str,
     mission_name: str,
@@ -261,46 +477,27 @@ def call_gemini_mission_agent(
         "parsed": {...} or None,
         "raw": <full model message content as string> or None
       }
-    Falls back to heuristics if GEMINI_API_KEY or requests isn't available, or on any error.
+    Falls back to heuristics if GEMINI_API_KEY or httpx isn't available, or on any error.
     """
-    api_key = os.getenv("GEMINI_API_KEY")
+    api_key = GEMINI_API_KEY
     if not api_key:
         return None
     try:
-        import requests  # type: ignore
+        client = get_gemini_client()
     except Exception:
         return None
 
-    system_prompt = (
-        "You are an underwater inspection mission assistant for NautiCAI. "
-        "Given structured detection data from hull/pipeline missions, you must:\n"
-        "1) Explain the mission risk level briefly.\n"
-        "2) Summarize the most important anomalies for an ROV/AUV operator.\n"
-        "3) Provide clear, concise next-step recommendations.\n"
-        "4) Generate a short WhatsApp-friendly alert message.\n"
-        "Respond strictly in compact JSON with keys: "
-        "headline (string), bullets (array of strings), "
-        "recommendations (string), whatsapp_message (string).\n\n"
-        "The whatsapp_message MUST follow this structure:\n"
-        "  - First line: \"Hey <operator_name>, we found <short risk summary>.\" (friendly but professional)\n"
-        "  - Then a blank line.\n"
-        "  - One line: \"Mission: <mission_name>\".\n"
-        "  - One line: \"Vessel/ROV: <vessel_id>\".\n"
-        "  - One line: \"Location: <location>\".\n"
-        "  - Blank line.\n"
-        "  - One line summarising counts, e.g. \"Detections: total=<total>, critical=<critical>, warnings=<warnings>.\".\n"
-        "  - Then a short bulleted list (max 3 bullets) of key findings, one per line, starting with \"• \".\n"
-        "  - Final line starting with \"Recommendation:\" and a concise action item.\n"
-        "Do not wrap the message in backticks or quotes. Keep it under 8 lines total."
-    )
-
     payload = {
         "risk_level": risk_level,
         "mission_name": mission_name,
         "vessel_id": vessel_id,
         "location": location,
         "operator_name": operator_name,
-        "anomaly_log": anomaly_log[:32],  # trim to keep payload small
+        # client merges logs across runs, so this is not bounded by MAX_VIDEO_LOG
+        "anomaly_log": [
+            {k: v for k, v in item.items() if k not in GEMINI_EXCLUDED_LOG_KEYS} if isinstance(item, dict) else item
+            for item in anomaly_log[:32]
+        ],
         "det_counts": det_counts,
         "summary": summary,
         "base_headline": base_headline,
@@ -308,9 +505,20 @@ def call_gemini_mission_agent(
         "base_whatsapp_message": base_whatsapp_message,
     }
 
+    # orjson rejects some valid JSON (e.g. integers beyond 64 bits); fall back to heuristics in that case
+    try:
+        cache_key = gemini_cache_key(payload)
+        payload_json = orjson.dumps(payload, default=str).decode("utf-8")
+    except orjson.JSONEncodeError:
+        return None
+
+    cached = GEMINI_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
     user_prompt = (
         "Here is the mission data in JSON format:\n"
-        f"{json.dumps(payload, ensure_ascii=False, indent=2)}\n\n"
+        f"{payload_json}\n\n"
         "Rewrite headline, bullets, recommendations and especially whatsapp_message to match the structure described "
         "above. Use operator_name, mission_name, vessel_id, location, summary.total, summary.critical and "
         "summary.warnings when constructing the message. "
@@ -319,19 +527,17 @@ def call_gemini_mission_agent(
 
     try:
         endpoint = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={api_key}"
-        resp = requests.post(
+        resp = await client.post(
             endpoint,
             headers={"Content-Type": "application/json"},
-            json={
+            content=orjson.dumps({
                 "contents": [
                     {
                         "role": "user",
+                        # Static system prompt first so Gemini's implicit prefix cache can reuse it
                         "parts": [
-                            {
-                                "text": system_prompt
-                                + "\n\n"
-                                + user_prompt
-                            }
+                            {"text": GEMINI_SYSTEM_PROMPT},
+                            {"text": user_prompt},
                         ],
                     }
                 ],
@@ -340,11 +546,10 @@ def call_gemini_mission_agent(
                     "maxOutputTokens": 512,
                     "responseMimeType": "application/json",
                 },
-            },
-            timeout=20,
+            }),
         )
         resp.raise_for_status()
-        data = resp.json()
+        data = orjson.loads(resp.content)
         candidates = data.get("candidates") or []
         if not candidates:
             return None
@@ -355,7 +560,7 @@ def call_gemini_mission_agent(
         # Try strict JSON first (response_format=json_object should enforce this)
         parsed = None
         try:
-            parsed = json.loads(content)
+            parsed = orjson.loads(content)
         except Exception:
             # Fallback: extract first JSON object from the text
             start = content.find("{")
@@ -363,38 +568,122 @@ def call_gemini_mission_agent(
             if start != -1 and end != -1 and end > start:
                 json_str = content[start : end + 1]
                 try:
-                    parsed = json.loads(json_str)
+                    parsed = orjson.loads(json_str)
                 except Exception:
                     parsed = None
-        return {"parsed": parsed, "raw": content}
+        result = {"parsed": parsed, "raw": content}
+        if parsed is not None:
+            GEMINI_CACHE[cache_key] = result
+        return result
     except Exception:
         return None
 
+# Encoded frames from recent detect calls, keyed by the frame_bytes_token returned to the client.
+# Bounded by total JPEG bytes; a miss (expired, evicted, other instance) falls back to frame_bytes_base64.
+# NAUTICAI_FRAME_CACHE_MB=0 disables it (no tokens are issued).
+FRAME_CACHE: TTLCache = TTLCache(
+    maxsize=max(int(os.getenv("NAUTICAI_FRAME_CACHE_MB", "64")), 0) << 20,
+    ttl=900,
+    getsizeof=len,
+)
+
 # ── Smart log (same logic as Streamlit, no session state) ───────────────────
-def smart_log(cn: str, cf: float, ts: str, frame_bytes: bytes, class_tracker: dict, anomaly_log: list, det_counts: dict) -> bool:
-    if cn not in class_tracker:
-        anomaly_log.append({
-            "class_name": cn,
-            "confidence": cf,
-            "timestamp": ts,
-            "frame_bytes": frame_bytes,
-        })
-        det_counts[cn] = det_counts.get(cn, 0) + 1
-        class_tracker[cn] = [cf]
-        return True
-    logged_confs = class_tracker[cn]
-    is_different = all(abs(cf - prev) >= DIFF_THRESHOLD for prev in logged_confs)
-    if is_different:
-        anomaly_log.append({
-            "class_name": cn,
-            "confidence": cf,
-            "timestamp": ts,
-            "frame_bytes": frame_bytes,
-        })
-        det_counts[cn] = det_counts.get(cn, 0) + 1
-        class_tracker[cn].append(cf)
-        return True
-    return False
+def smart_log(cn: str, cf: float, ts: str, frame_bytes: bytes | None, class_tracker: dict, anomaly_log: list | deque, det_counts: dict) -> bool:
+    # class_tracker[cn] is kept sorted, so only the neighbours around cf's insertion point can be
+    # within DIFF_THRESHOLD — O(log n) instead of comparing against every logged confidence.
+    logged_confs = class_tracker.setdefault(cn, [])
+    idx = bisect.bisect_left(logged_confs, cf)
+    if idx > 0 and cf - logged_confs[idx - 1] < DIFF_THRESHOLD:
+        return False
+    if idx < len(logged_confs) and logged_confs[idx] - cf < DIFF_THRESHOLD:
+        return False
+    anomaly_log.append({
+        "class_name": cn,
+        "confidence": cf,
+        "timestamp": ts,
+        "frame_bytes": frame_bytes,
+    })
+    det_counts[cn] = det_counts.get(cn, 0) + 1
+    logged_confs.insert(idx, cf)
+    return True
+
+def summarize_anomaly_log(anomaly_log) -> dict:
+    """Total / critical / warnings / normal counts in a single pass over anomaly_log."""
+    crit = warn = norm = 0
+    for x in anomaly_log:
+        cn = x["class_name"]
+        if cn in CRITICAL_SET:
+            crit += 1
+        elif cn in WARNING_SET:
+            warn += 1
+        elif cn in NORMAL_SET:
+            norm += 1
+    return {"total": len(anomaly_log), "critical": crit, "warnings": warn, "normal": norm}
+
+def summarize_det_counts(det_counts: dict) -> dict:
+    """Same shape as summarize_anomaly_log, from det_counts (which still counts entries a bounded log dropped)."""
+    return {
+        "total": sum(det_counts.values()),
+        "critical": sum(det_counts.get(cn, 0) for cn in CRITICAL_SET),
+        "warnings": sum(det_counts.get(cn, 0) for cn in WARNING_SET),
+        "normal": sum(det_counts.get(cn, 0) for cn in NORMAL_SET),
+    }
+
+def to_client_anomaly_log(anomaly_log: list | deque, encoded: dict | None = None) -> list:
+    """
+    Copy anomaly_log for the JSON response with frame_bytes as base64, plus a frame_bytes_token
+    that /api/report/generate can resolve from FRAME_CACHE without decoding the base64 again.
+    Entries logged from the same frame share one bytes object, so each frame is encoded and cached once
+    (`encoded` maps id(frame_bytes) -> base64 and may be pre-seeded by the caller).
+    """
+    encoded = {} if encoded is None else encoded
+    tokens = {}
+    out = []
+    for item in anomaly_log:
+        entry = {
+            "class_name": item["class_name"],
+            "confidence": item["confidence"],
+            "timestamp": item["timestamp"],
+        }
+        frame_bytes = item.get("frame_bytes")
+        if frame_bytes:
+            key = id(frame_bytes)
+            if key not in encoded:
+                encoded[key] = base64.b64encode(frame_bytes).decode("utf-8")
+            # Frames larger than the whole cache (or a disabled cache) get no token; TTLCache would raise
+            if key not in tokens and len(frame_bytes) <= FRAME_CACHE.maxsize:
+                tokens[key] = secrets.token_urlsafe(12)
+                FRAME_CACHE[tokens[key]] = frame_bytes
+            entry["frame_bytes_base64"] = encoded[key]
+            if key in tokens:
+                entry["frame_bytes_token"] = tokens[key]
+        out.append(entry)
+    return out
+
+def read_frame_batch(cap, fc: int, limit: int, frame_skip: int, simulate_underwater: bool, turbidity: str, marine_snow: bool):
+    """
+    Read up to `limit` sampled frames from `cap`, continuing from frame counter `fc`.
+    Returns (frames, frame_ids, fc); frames is empty once the video is exhausted.
+    """
+    frames = []
+    frame_ids = []
+    while len(frames) < limit and cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+        fc += 1
+        if fc % frame_skip != 0:
+            continue
+        # YOLO downsamples to INFER_IMGSZ anyway; shrinking first makes simulation/plot/encode cheaper
+        h, w = frame.shape[:2]
+        if max(h, w) > MAX_VIDEO_SIDE:
+            scale = MAX_VIDEO_SIDE / max(h, w)
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        if simulate_underwater:
+            frame = apply_full_underwater_simulation(frame, turbidity, marine_snow)
+        frames.append(frame)
+        frame_ids.append(fc)
+    return frames, frame_ids, fc
 
 # ── Schemas ─────────────────────────────────────────────────────────────────
 class ReportGenerateRequest(BaseModel):
@@ -640,7 +929,7 @@ def auth_me(current_user: User = Depends(get_current_user)):
 def health():
     """
     Lightweight liveness check for Render (no model load).
-    Returns quickly to avoid health-check timeouts and extra memory; model loads on first /api/detect/* only.
+    Returns quickly to avoid health-check timeouts and extra memory; the model warms up in the background.
     """
     return {
         "status": "ok",
@@ -669,13 +958,6 @@ async def detect_image(
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to read file: {e}")
 
-    # Lazy imports avoid heavy cv2/numpy import cost during service startup
-    try:
-        import cv2
-        import numpy as np
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to import image libraries: {e}")
-
     img = cv2.imdecode(np.frombuffer(raw, dtype=np.uint8), cv2.IMREAD_COLOR)
     if img is None:
         raise HTTPException(status_code=400, detail="Could not decode image")
@@ -691,6 +973,10 @@ async def detect_image(
     ann = res.plot()
     boxes = res.boxes
 
+    # Encode the annotated frame once; it backs both the preview image and every anomaly_log entry
+    frame_bytes = encode_jpeg(ann)
+    annotated_base64 = base64.b64encode(frame_bytes).decode("utf-8")
+
     detections = []
     anomaly_log = []
     det_counts = {}
@@ -698,47 +984,27 @@ async def detect_image(
     ts = time.strftime("%H:%M:%S")
 
     if boxes is not None and len(boxes) > 0:
-        import cv2
-        _, buf = cv2.imencode(".jpg", cv2.cvtColor(ann, cv2.COLOR_BGR2RGB))
-        frame_bytes = buf.tobytes()
-        for box in boxes:
-            cn = m.names[int(box.cls[0])]
-            cf = float(box.conf[0])
+        # One device->host transfer for all boxes instead of a sync per box
+        cls = boxes.cls.cpu().numpy().astype(np.int32)
+        cfs = boxes.conf.cpu().numpy().astype(np.float32)
+        names = get_class_name_array(m)[cls]
+        for cn, cf in zip(names.tolist(), cfs.tolist()):
             detections.append({
                 "class_name": cn,
                 "confidence": cf,
-                "severity": SEVERITY.get(cn, ("WARNING", "w", "b-w"))[0],
+                "severity": CLASS_TO_SEVERITY.get(cn, _DEFAULT_SEV),
             })
             smart_log(cn, cf, ts, frame_bytes, class_tracker, anomaly_log, det_counts)
 
-    # Encode annotated image for frontend
-    import cv2
-    _, ann_buf = cv2.imencode(".jpg", cv2.cvtColor(ann, cv2.COLOR_BGR2RGB))
-    annotated_base64 = base64.b64encode(ann_buf.tobytes()).decode("utf-8")
-
     # For report API, frontend needs anomaly_log with frame_bytes as base64
-    anomaly_log_for_client = []
-    for item in anomaly_log:
-        entry = {
-            "class_name": item["class_name"],
-            "confidence": item["confidence"],
-            "timestamp": item["timestamp"],
-        }
-        if item.get("frame_bytes"):
-            entry["frame_bytes_base64"] = base64.b64encode(item["frame_bytes"]).decode("utf-8")
-        anomaly_log_for_client.append(entry)
+    anomaly_log_for_client = to_client_anomaly_log(anomaly_log, {id(frame_bytes): annotated_base64})
 
     return {
         "detections": detections,
         "det_counts": det_counts,
         "anomaly_log": anomaly_log_for_client,
         "annotated_image_base64": annotated_base64,
-        "summary": {
-            "total": len(anomaly_log),
-            "critical": sum(1 for x in anomaly_log if x["class_name"] in ("corrosion", "damage", "free_span")),
-            "warnings": sum(1 for x in anomaly_log if x["class_name"] in ("marine_growth", "debris")),
-            "normal": sum(1 for x in anomaly_log if x["class_name"] in ("healthy", "anode")),
-        },
+        "summary": summarize_anomaly_log(anomaly_log),
     }
 
 @app.post("/api/detect/video")
@@ -759,20 +1025,19 @@ async def detect_video(
     if not file.filename or not any(file.filename.lower().endswith(ext) for ext in (".mp4", ".avi", ".mov")):
         raise HTTPException(status_code=400, detail="File must be a video (mp4, avi, mov)")
 
-    try:
-        raw = await file.read()
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to read file: {e}")
-
+    # Stream the upload to disk in chunks so peak memory doesn't grow with video size
     suffix = Path(file.filename or "video").suffix or ".mp4"
     with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as t:
-        t.write(raw)
-        t.flush()
         path = t.name
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                t.write(chunk)
+        except Exception as e:
+            t.close()
+            os.unlink(path)
+            raise HTTPException(status_code=400, detail=f"Failed to read file: {e}")
 
     try:
-        import cv2
-
         cap = cv2.VideoCapture(path)
         if not cap.isOpened():
             raise HTTPException(status_code=400, detail="Could not open video")
@@ -780,44 +1045,54 @@ async def detect_video(
         frames_total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         fps = max(cap.get(cv2.CAP_PROP_FPS), 1)
 
-        anomaly_log = []
+        # Bounded at source: long videos keep only the most recent MAX_VIDEO_LOG entries
+        anomaly_log = deque(maxlen=MAX_VIDEO_LOG)
         det_counts = {}
         class_tracker = {}
         m = get_model()
+        class_names = get_class_name_array(m)
         pc = 0
-        fc = 0
-
-        while cap.isOpened() and (max_frames <= 0 or pc < max_frames):
-            ret, frame = cap.read()
-            if not ret:
-                break
-            fc += 1
-            if fc % frame_skip != 0:
-                continue
-
-            if simulate_underwater:
-                frame = apply_full_underwater_simulation(frame, turbidity, marine_snow)
-
-            results = m.predict(frame, conf=confidence, verbose=False)
-            ann = results[0].plot()
-            current_sec = fc / fps
-            mm, ss = int(current_sec // 60), int(current_sec % 60)
-            ts = f"{mm:02d}:{ss:02d}"
-
-            if results[0].boxes and len(results[0].boxes) > 0:
-                import cv2
-                _, buf = cv2.imencode(".jpg", cv2.cvtColor(ann, cv2.COLOR_BGR2RGB))
-                frame_bytes = buf.tobytes()
-                best_per_class = {}
-                for box in results[0].boxes:
-                    cn = m.names[int(box.cls[0])]
-                    cf = float(box.conf[0])
-                    if cn not in best_per_class or cf > best_per_class[cn]:
-                        best_per_class[cn] = cf
-                for cn, cf in best_per_class.items():
-                    smart_log(cn, cf, ts, frame_bytes, class_tracker, anomaly_log, det_counts)
-
-            pc += 1
+
+        def next_batch(fc: int):
+            limit = VIDEO_BATCH_SIZE if max_frames <= 0 else min(VIDEO_BATCH_SIZE, max_frames - pc)
+            if limit <= 0:
+                return None
+            return reader.submit(
+                read_frame_batch, cap, fc, limit, frame_skip, simulate_underwater, turbidity, marine_snow
+            )
+
+        # Decode (+ underwater simulation) of the next batch overlaps with inference on the current one
+        with ThreadPoolExecutor(max_workers=1) as reader:
+            pending = next_batch(0)
+            while pending is not None:
+                frames, frame_ids, fc = pending.result()
+                if not frames:
+                    break
+                pc += len(frames)
+                pending = next_batch(fc)
+
+                results = m.predict(frames, conf=confidence, imgsz=INFER_IMGSZ, verbose=False)
+                for frame_id, res in zip(frame_ids, results):
+                    current_sec = frame_id / fps
+                    mm, ss = int(current_sec // 60), int(current_sec % 60)
+                    ts = f"{mm:02d}:{ss:02d}"
+
+                    if res.boxes and len(res.boxes) > 0:
+                        # Best confidence per class: sort by confidence, keep the first box of each class id
+                        cls = res.boxes.cls.cpu().numpy().astype(np.int32)
+                        cfs = res.boxes.conf.cpu().numpy().astype(np.float32)
+                        order = np.argsort(-cfs, kind="stable")
+                        best_cls, first = np.unique(cls[order], return_index=True)
+                        best_cfs = cfs[order][first]
+                        n_new = sum(
+                            smart_log(cn, cf, ts, None, class_tracker, anomaly_log, det_counts)
+                            for cn, cf in zip(class_names[best_cls].tolist(), best_cfs.tolist())
+                        )
+                        # Draw + encode only frames whose output is kept, then backfill the new (rightmost) entries
+                        if n_new:
+                            frame_bytes = encode_jpeg(res.plot())
+                            for i in range(1, min(n_new, len(anomaly_log)) + 1):
+                                anomaly_log[-i]["frame_bytes"] = frame_bytes
 
         cap.release()
     finally:
@@ -827,26 +1102,14 @@ async def detect_video(
             pass
 
     # Build client-friendly anomaly_log with base64 frame_bytes
-    anomaly_log_for_client = []
-    for item in anomaly_log:
-        entry = {
-            "class_name": item["class_name"],
-            "confidence": item["confidence"],
-            "timestamp": item["timestamp"],
-        }
-        if item.get("frame_bytes"):
-            entry["frame_bytes_base64"] = base64.b64encode(item["frame_bytes"]).decode("utf-8")
-        anomaly_log_for_client.append(entry)
+    anomaly_log_for_client = to_client_anomaly_log(anomaly_log)
 
     return {
         "anomaly_log": anomaly_log_for_client,
         "det_counts": det_counts,
-        "summary": {
-            "total": len(anomaly_log),
-            "critical": sum(1 for x in anomaly_log if x["class_name"] in ("corrosion", "damage", "free_span")),
-            "warnings": sum(1 for x in anomaly_log if x["class_name"] in ("marine_growth", "debris")),
-            "normal": sum(1 for x in anomaly_log if x["class_name"] in ("healthy", "anode")),
-        },
+        # Counts cover every logged detection, including entries the MAX_VIDEO_LOG cap dropped from anomaly_log
+        "summary": summarize_det_counts(det_counts),
+        "log_truncated": sum(det_counts.values()) > len(anomaly_log),
         "frames_processed": pc,
     }
 
@@ -854,20 +1117,29 @@ async def detect_video(
 async def report_generate(body: ReportGenerateRequest, current_user: User = Depends(get_current_user)):
     """
     Generate PDF from anomaly_log. Accepts anomaly_log from /api/detect/image or /api/detect/video.
-    Each item may have frame_bytes_base64 (from API) or frame_bytes (bytes); we normalize to bytes for report_gen.
+    Each item may have frame_bytes_token (resolved from FRAME_CACHE), frame_bytes_base64 (from API)
+    or frame_bytes (bytes); we normalize to bytes for report_gen.
     """
     anomaly_log = []
+    # Entries logged from the same frame carry the same base64 string; decode each distinct frame once
+    decoded = {}
     for item in body.anomaly_log:
         entry = {
             "class_name": item.get("class_name", "unknown"),
             "confidence": float(item.get("confidence", 0)),
             "timestamp": item.get("timestamp", "N/A"),
         }
-        if item.get("frame_bytes_base64"):
-            try:
-                entry["frame_bytes"] = base64.b64decode(item["frame_bytes_base64"])
-            except Exception:
-                entry["frame_bytes"] = None
+        b64 = item.get("frame_bytes_base64")
+        cached = FRAME_CACHE.get(item.get("frame_bytes_token") or "")
+        if cached is not None:
+            entry["frame_bytes"] = cached
+        elif b64:
+            if b64 not in decoded:
+                try:
+                    decoded[b64] = base64.b64decode(b64)
+                except Exception:
+                    decoded[b64] = None
+            entry["frame_bytes"] = decoded[b64]
         elif item.get("frame_bytes"):
             # If client sent raw bytes in JSON (uncommon), would need special handling; base64 is preferred
             entry["frame_bytes"] = item["frame_bytes"]
@@ -875,22 +1147,32 @@ async def report_generate(body: ReportGenerateRequest, current_user: User = Depe
             entry["frame_bytes"] = None
         anomaly_log.append(entry)
 
+    # Build into a buffer we stream from, rather than copying it out to one large bytes object
+    pdf_buf = io.BytesIO()
     try:
-        pdf_bytes = generate_report(
+        generate_report(
             anomaly_log=anomaly_log,
             mission_name=body.mission_name,
             operator_name=body.operator_name,
             vessel_id=body.vessel_id,
             location=body.location,
+            out=pdf_buf,
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Report generation failed: {e}")
+    # Decoded frames are no longer needed while the PDF streams out (cache hits stay owned by FRAME_CACHE)
+    del anomaly_log, decoded
+    pdf_size = pdf_buf.tell()
+    pdf_buf.seek(0)
 
     filename = f"nauticai_{time.strftime('%Y%m%d_%H%M%S')}.pdf"
-    return Response(
-        content=pdf_bytes,
+    return StreamingResponse(
+        iter(lambda: pdf_buf.read(REPORT_CHUNK_SIZE), b""),
         media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Content-Length": str(pdf_size),
+        },
     )
 
 
@@ -908,11 +1190,8 @@ async def agent_mission_summary(body: AgentMissionRequest, current_user: User =
     summary = body.summary or {}
 
     total = summary.get("total") or len(anomaly_log)
-    critical_classes = {"corrosion", "damage", "free_span"}
-    warning_classes = {"marine_growth", "debris"}
-
-    crit_count = sum(det_counts.get(cls, 0) for cls in critical_classes)
-    warn_count = sum(det_counts.get(cls, 0) for cls in warning_classes)
+    crit_count = sum(det_counts.get(cls, 0) for cls in CRITICAL_SET)
+    warn_count = sum(det_counts.get(cls, 0) for cls in WARNING_SET)
 
     # Basic risk scoring heuristic
     if crit_count >= 2 or (crit_count == 1 and warn_count >= 3):
@@ -993,7 +1272,7 @@ async def agent_mission_summary(body: AgentMissionRequest, current_user: User =
     whatsapp_message = "\n".join(lines)
 
     # Optional Groq LLM enhancement
-    groq_enhancement = call_gemini_mission_agent(
+    groq_enhancement = await call_gemini_mission_agent(
         risk_level=risk_level,
         mission_name=body.mission_name,
         vessel_id=body.vessel_id,
@@ -1020,12 +1299,15 @@ async def agent_mission_summary(body: AgentMissionRequest, current_user: User =
         llm_used = True
 
     if body.send_whatsapp and body.phone and risk_level in {"MEDIUM", "HIGH"}:
-        sent, info = send_whatsapp_alert(
-            phone=body.phone,
-            mission_name=body.mission_name or "Unknown Mission",
-            vessel_id=body.vessel_id or "Unknown Vessel",
-            risk_level=risk_level,
-            recommendation=recommendations
+        # Twilio SDK is blocking; run it in the default executor so the event loop stays free
+        sent, info = await asyncio.get_running_loop().run_in_executor(
+            None,
+            send_whatsapp_alert,
+            body.phone,
+            body.mission_name or "Unknown Mission",
+            body.vessel_id or "Unknown Vessel",
+            risk_level,
+            recommendations,
         )
         whatsapp_result = {"attempted": True, "sent": sent, "info": info}
     else:
@@ -112,9 +112,12 @@ def generate_report(
     operator_name = "NautiCAI Operator",
     vessel_id     = "ROV-NautiCAI-01",
     location      = "Offshore Location",
-    output_path   = "nauticai_report.pdf"
+    output_path   = "nauticai_report.pdf",
+    out           = None,
 ):
-    buf = io.BytesIO()
+    # Pass a writable file-like `out` to have the PDF written there (returns `out`);
+    # otherwise the PDF bytes are returned.
+    buf = out if out is not None else io.BytesIO()
     doc = SimpleDocTemplate(
         buf, pagesize=A4,
         leftMargin=1.5*cm, rightMargin=1.5*cm,
@@ -401,6 +404,8 @@ def generate_report(
     ))
 
     doc.build(story)
+    if out is not None:
+        return out
     result = buf.getvalue()
     buf.close()
     return result
@@ -140,16 +140,23 @@ def evaluate_model(weights_path='weights/best.pt', data_yaml='data.yaml'):
     return metrics
 
 
-def export_model(weights_path='weights/best.pt'):
-    """Export model to ONNX for edge deployment"""
-    print("\nExporting model to ONNX for Jetson deployment...")
+def export_model(weights_path='weights/best.pt', fmt='onnx', imgsz=640):
+    """Export model to ONNX / TensorRT; main_api picks up weights/best.onnx or best.engine automatically"""
     model = YOLO(weights_path)
 
-    # Export to ONNX
-    model.export(format='onnx', imgsz=640, simplify=True)
+    if fmt == 'engine':
+        # TensorRT FP16, dynamic batch so the API can run batched video inference
+        print("\nExporting model to TensorRT (FP16)...")
+        model.export(format='engine', imgsz=imgsz, half=True, dynamic=True, batch=16)
+        print("✅ TensorRT export complete: weights/best.engine")
+        return
+
+    print("\nExporting model to ONNX for Jetson deployment...")
+    # Export to ONNX (dynamic axes so batch size and frame shape can vary at inference time)
+    model.export(format='onnx', imgsz=imgsz, simplify=True, dynamic=True)
     print("✅ ONNX export complete: weights/best.onnx")
-    print("\nFor TensorRT on Jetson, run:")
-    print("  /usr/src/tensorrt/bin/trtexec --onnx=best.onnx --saveEngine=best.engine --fp16")
+    print("\nFor TensorRT (dynamic batch, usable by main_api video inference), run:")
+    print(f"  python train.py --mode export --format engine --weights {weights_path}")
 
 
 if __name__ == "__main__":
@@ -164,6 +171,9 @@ if __name__ == "__main__":
     parser.add_argument('--batch', type=int, default=16)
     parser.add_argument('--imgsz', type=int, default=640)
     parser.add_argument('--weights', type=str, default='weights/best.pt')
+    parser.add_argument('--format', type=str, default='onnx',
+                        choices=['onnx', 'engine'],
+                        help='Export format (export mode only)')
 
     args = parser.parse_args()
 
@@ -177,4 +187,4 @@ if __name__ == "__main__":
     elif args.mode == 'eval':
         evaluate_model(weights_path=args.weights)
     elif args.mode == 'export':
-        export_model(weights_path=args.weights)
\ No newline at end of file
+        export_model(weights_path=args.weights, fmt=args.format, imgsz=args.imgsz)
\ No newline at end of file